@@ -1,6 +1,24 @@
+import hashlib
+import importlib.machinery
+import importlib.util
+import logging
+import os
+import tempfile
+from pathlib import Path
+
 import streamlit as st
+import joblib
 import numpy as np
-from sklearn.tree import DecisionTreeClassifier, export_text
+import sklearn
+from sklearn.tree import DecisionTreeClassifier
+
+# Numba is optional; without it predict_grid falls back to predict().
+# The kernel lives in its own module so Numba's disk cache is tied to an
+# importable module rather than to this script.
+try:
+    from tree_walk import walk
+except ImportError:
+    walk = None
 
 # -----------------------------
 # BASIC PAGE SETUP
@@ -30,13 +48,46 @@ st.markdown("---")
 # -----------------------------
 # PLANT KNOWLEDGE BASE
 # -----------------------------
-PLANT_DB = {
-    "rose": {
-        "name": "Garden Rose (Rosa spp.)",
-        "family": "Rosaceae",
-        "group": "Flowering shrub",
-        "image": "images/rose.jpg",
-        "description": """
+# Per-species attributes as parallel tuples, indexed by class id.
+# Class ids are the integer training labels in Y_TRAIN.
+CLASS_NAMES = ("lavender", "rose", "sunflower", "bamboo")
+NAMES = (
+    "Lavender (Lavandula angustifolia)",
+    "Garden Rose (Rosa spp.)",
+    "Sunflower (Helianthus annuus)",
+    "Bamboo (Bambusoideae spp.)",
+)
+FAMILIES = (
+    "Lamiaceae",
+    "Rosaceae",
+    "Asteraceae",
+    "Poaceae (Grasses)",
+)
+GROUPS = (
+    "Aromatic subshrub",
+    "Flowering shrub",
+    "Tall annual herb",
+    "Woody grass",
+)
+IMAGES = (
+    "images/lavender.jpg",
+    "images/rose.jpg",
+    "images/sunflower.jpg",
+    "images/bamboo.jpg",
+)
+DESCRIPTIONS = (
+    """
+Lavender is a small aromatic shrub with narrow, gray-green leaves and violet flower spikes.
+It contains essential oils with a strong fragrance and is widely used in perfumery and aromatherapy.
+
+**Key characteristics:**
+- Height: 30–90 cm
+- Growth form: low, bushy subshrub with woody base
+- Leaves: narrow, linear, gray-green
+- Flowers: small, violet to purple, in spikes
+- Uses: essential oils, perfumes, herbal remedies, ornamental borders
+""",
+    """
 Roses are woody, perennial flowering shrubs widely grown for their attractive and often fragrant blooms.
 They usually have multiple stems bearing thorns, and the leaves are compound with serrated leaflets.
 Roses prefer well-drained soil and full sun and are extremely popular in ornamental gardens and as cut flowers.
@@ -48,18 +99,7 @@ Roses prefer well-drained soil and full sun and are extremely popular in ornamen
 - Flowers: large, layered petals in many colors
 - Uses: ornamental gardening, perfumes, rose oil, cut flowers
 """,
-        "other_plants": [
-            "Wild Rose (Rosa canina)",
-            "Damask Rose (Rosa × damascena)",
-            "China Rose (Rosa chinensis)",
-        ],
-    },
-    "sunflower": {
-        "name": "Sunflower (Helianthus annuus)",
-        "family": "Asteraceae",
-        "group": "Tall annual herb",
-        "image": "images/sunflower.jpg",
-        "description": """
+    """
 Sunflowers are tall annual herbs known for their large, bright yellow flower heads.
 The flower head is a composite of many small florets. The plant has a thick, fibrous stem
 and broad, rough leaves, and is cultivated worldwide for edible seeds and oil.
@@ -71,40 +111,7 @@ and broad, rough leaves, and is cultivated worldwide for edible seeds and oil.
 - Flower: large yellow head with many florets
 - Uses: seeds, cooking oil, ornamental, bird feed
 """,
-        "other_plants": [
-            "Jerusalem Artichoke (Helianthus tuberosus)",
-            "Oxeye Daisy (Leucanthemum vulgare)",
-            "Marigold (Tagetes spp.)",
-        ],
-    },
-    "lavender": {
-        "name": "Lavender (Lavandula angustifolia)",
-        "family": "Lamiaceae",
-        "group": "Aromatic subshrub",
-        "image": "images/lavender.jpg",
-        "description": """
-Lavender is a small aromatic shrub with narrow, gray-green leaves and violet flower spikes.
-It contains essential oils with a strong fragrance and is widely used in perfumery and aromatherapy.
-
-**Key characteristics:**
-- Height: 30–90 cm
-- Growth form: low, bushy subshrub with woody base
-- Leaves: narrow, linear, gray-green
-- Flowers: small, violet to purple, in spikes
-- Uses: essential oils, perfumes, herbal remedies, ornamental borders
-""",
-        "other_plants": [
-            "Rosemary (Salvia rosmarinus)",
-            "Sage (Salvia officinalis)",
-            "Thyme (Thymus vulgaris)",
-        ],
-    },
-    "bamboo": {
-        "name": "Bamboo (Bambusoideae spp.)",
-        "family": "Poaceae (Grasses)",
-        "group": "Woody grass",
-        "image": "images/bamboo.jpg",
-        "description": """
+    """
 Bamboo is a fast-growing woody grass with hollow, segmented stems called culms.
 Many species grow very tall and form dense clumps or groves. Bamboo is an important
 material for construction, furniture, paper and also provides edible young shoots.
@@ -116,81 +123,305 @@ material for construction, furniture, paper and also provides edible young shoot
 - Growth: clumping or running, forming thickets
 - Uses: building material, furniture, flooring, paper, edible shoots
 """,
-        "other_plants": [
-            "Sugarcane (Saccharum officinarum)",
-            "Common Reed (Phragmites australis)",
-            "Giant Reed (Arundo donax)",
-        ],
-    },
-}
+)
+OTHERS = (
+    (
+        "Rosemary (Salvia rosmarinus)",
+        "Sage (Salvia officinalis)",
+        "Thyme (Thymus vulgaris)",
+    ),
+    (
+        "Wild Rose (Rosa canina)",
+        "Damask Rose (Rosa × damascena)",
+        "China Rose (Rosa chinensis)",
+    ),
+    (
+        "Jerusalem Artichoke (Helianthus tuberosus)",
+        "Oxeye Daisy (Leucanthemum vulgare)",
+        "Marigold (Tagetes spp.)",
+    ),
+    (
+        "Sugarcane (Saccharum officinarum)",
+        "Common Reed (Phragmites australis)",
+        "Giant Reed (Arundo donax)",
+    ),
+)
 
-STEM_MAP = {"thin": 0, "medium": 1, "thick": 2}
+# Stem quality code is the position in this tuple
+STEM_OPTIONS = ("thin", "medium", "thick")
+
+APP_DIR = Path(__file__).parent
+CACHE_DIR = Path.home() / ".cache" / "plant_id"
+
+logger = logging.getLogger(__name__)
 
 # -----------------------------
 # TRAIN DECISION TREE
 # -----------------------------
-def train_model():
-    X = []
-    y = []
-
-    # Lavender: short / medium, thin stem, narrow leaves
-    lavender_samples = [
-        [30, 1.0, STEM_MAP["thin"]],
-        [40, 1.5, STEM_MAP["thin"]],
-        [60, 2.0, STEM_MAP["thin"]],
-        [50, 2.3, STEM_MAP["thin"]],
-    ]
-    X.extend(lavender_samples)
-    y.extend(["lavender"] * len(lavender_samples))
-
-    # Rose: medium height shrubs, thin/medium stem, moderate width
-    rose_samples = [
-        [60, 4.0, STEM_MAP["thin"]],
-        [80, 5.0, STEM_MAP["medium"]],
-        [120, 6.0, STEM_MAP["medium"]],
-        [90, 3.5, STEM_MAP["thin"]],
-    ]
-    X.extend(rose_samples)
-    y.extend(["rose"] * len(rose_samples))
-
-    # Sunflower: tall, medium/thick stem, broad leaves
-    sunflower_samples = [
-        [180, 10.0, STEM_MAP["medium"]],
-        [200, 12.0, STEM_MAP["thick"]],
-        [220, 8.0, STEM_MAP["medium"]],
-        [250, 11.0, STEM_MAP["thick"]],
-    ]
-    X.extend(sunflower_samples)
-    y.extend(["sunflower"] * len(sunflower_samples))
-
-    # Bamboo: tall to very tall, thick stem, narrower leaves
-    bamboo_samples = [
-        [220, 3.0, STEM_MAP["thick"]],
-        [300, 4.0, STEM_MAP["thick"]],
-        [260, 2.5, STEM_MAP["thick"]],
-        [350, 5.0, STEM_MAP["thick"]],
-    ]
-    X.extend(bamboo_samples)
-    y.extend(["bamboo"] * len(bamboo_samples))
+FEATURE_NAMES = ["height_cm", "leaf_width_cm", "stem_quality_code"]
+
+# Training samples: height_cm, leaf_width_cm, stem code (0 thin, 1 medium, 2 thick).
+# Rows are grouped by class in class-id order, four per species; Y_TRAIN is
+# built from that layout, so add new samples to their species' block.
+X_TRAIN = np.array(
+    [
+        # Lavender: short / medium, thin stem, narrow leaves
+        [30, 1.0, 0],
+        [40, 1.5, 0],
+        [60, 2.0, 0],
+        [50, 2.3, 0],
+        # Rose: medium height shrubs, thin/medium stem, moderate width
+        [60, 4.0, 0],
+        [80, 5.0, 1],
+        [120, 6.0, 1],
+        [90, 3.5, 0],
+        # Sunflower: tall, medium/thick stem, broad leaves
+        [180, 10.0, 1],
+        [200, 12.0, 2],
+        [220, 8.0, 1],
+        [250, 11.0, 2],
+        # Bamboo: tall to very tall, thick stem, narrower leaves
+        [220, 3.0, 2],
+        [300, 4.0, 2],
+        [260, 2.5, 2],
+        [350, 5.0, 2],
+    ],
+    dtype=np.float32,
+)
+# Integer class ids, see CLASS_NAMES
+Y_TRAIN = np.array([0] * 4 + [1] * 4 + [2] * 4 + [3] * 4, dtype=np.int32)
 
-    X = np.array(X)
-    y = np.array(y)
+# Column order is kept as-is on purpose. The fitted tree only splits on
+# leaf width (root, probed by every sample) and stem code; height is never
+# used. Several root splits tie on Gini here and random_state breaks the tie
+# through a feature permutation, so reordering columns changes the fitted
+# tree (and its predictions), not just the layout of the generated code.
+def make_model():
+    return DecisionTreeClassifier(max_depth=4, random_state=42)
 
-    clf = DecisionTreeClassifier(max_depth=4, random_state=42)
-    clf.fit(X, y)
+def train_model():
+    return make_model().fit(X_TRAIN, Y_TRAIN)
+
+@st.cache_resource
+def load_model():
+    # Reuse a previously fitted tree across restarts. The file name is keyed
+    # on the training data, the estimator parameters and the library versions
+    # that shape the pickle, so any of those changing retrains it.
+    # The disk copy is only a shortcut: an unreadable or unwritable cache
+    # falls back to fitting in memory.
+    key = hashlib.sha1()
+    key.update(X_TRAIN.tobytes())
+    key.update(Y_TRAIN.tobytes())
+    key.update(repr(sorted(make_model().get_params().items())).encode())
+    for version in (sklearn.__version__, np.__version__, joblib.__version__):
+        key.update(version.encode())
+    path = CACHE_DIR / f"plant_tree_{key.hexdigest()[:12]}.joblib"
+    if path.exists():
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            logger.warning("Ignoring unreadable model cache %s: %s", path, e)
+
+    clf = train_model()
+    tmp = None
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial dump
+        with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix=".tmp", delete=False) as f:
+            tmp = f.name
+            joblib.dump(clf, f, compress=0)
+        os.replace(tmp, path)
+    except OSError:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
     return clf
 
-model = train_model()
-
-def classify_plant(height_cm, width_cm, stem_quality):
-    stem_code = STEM_MAP[stem_quality]
-    sample = np.array([[height_cm, width_cm, stem_code]])
-    pred = model.predict(sample)[0]
-    rules = export_text(
-        model,
-        feature_names=["height_cm", "leaf_width_cm", "stem_quality_code"],
+# Class id for every node of the tree. Y_TRAIN holds ids 0..n-1, so
+# model.classes_ is the identity and the argmax is the label itself.
+def leaf_labels(tree):
+    return tree.value.squeeze(1).argmax(1).astype(np.int32)
+
+@st.cache_resource
+def tree_rules():
+    # Same layout as sklearn's export_text, walked straight off tree_
+    tree = load_model().tree_
+    leaf_label = leaf_labels(tree)
+    lines = []
+
+    def emit(node, depth):
+        pad = "|   " * depth + "|--- "
+        if tree.children_left[node] == -1:
+            lines.append(f"{pad}class: {CLASS_NAMES[leaf_label[node]]}")
+            return
+        name = FEATURE_NAMES[tree.feature[node]]
+        threshold = tree.threshold[node]
+        lines.append(f"{pad}{name} <= {threshold:.2f}")
+        emit(tree.children_left[node], depth + 1)
+        lines.append(f"{pad}{name} >  {threshold:.2f}")
+        emit(tree.children_right[node], depth + 1)
+
+    emit(0, 0)
+    return "\n".join(lines) + "\n"
+
+# Emit Python source for a nested if/else mirroring the fitted tree.
+# Leaves return the class id.
+def tree_source(clf):
+    tree = clf.tree_
+    leaf_label = leaf_labels(tree)
+    lines = ["def _predict(x0, x1, x2):"]
+
+    def emit(node, depth):
+        pad = "    " * depth
+        if tree.children_left[node] == -1:
+            lines.append(f"{pad}return {leaf_label[node]}")
+            return
+        lines.append(f"{pad}if x{tree.feature[node]} <= {float(tree.threshold[node])!r}:")
+        emit(tree.children_left[node], depth + 1)
+        lines.append(f"{pad}else:")
+        emit(tree.children_right[node], depth + 1)
+
+    emit(0, 1)
+    return "\n".join(lines) + "\n"
+
+# Same tree as C source, compiled with cffi when it is available
+def tree_c_source(clf):
+    tree = clf.tree_
+    leaf_label = leaf_labels(tree)
+    lines = ["int predict(double x0, double x1, double x2) {"]
+
+    def emit(node, depth):
+        pad = "    " * depth
+        if tree.children_left[node] == -1:
+            lines.append(f"{pad}return {leaf_label[node]};")
+            return
+        lines.append(f"{pad}if (x{tree.feature[node]} <= {float(tree.threshold[node])!r}) {{")
+        emit(tree.children_left[node], depth + 1)
+        lines.append(f"{pad}}} else {{")
+        emit(tree.children_right[node], depth + 1)
+        lines.append(f"{pad}}}")
+
+    emit(0, 1)
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+# Failures that mean "no native build here": cffi missing, no compiler or
+# headers, or an unwritable cache. Anything else is a bug and is raised.
+def native_build_errors():
+    errors = [ImportError, OSError]
+    try:
+        from cffi import CDefError, VerificationError
+        errors += [CDefError, VerificationError]
+    except ImportError:
+        pass
+    try:
+        from setuptools.errors import BaseError  # distutils' DistutilsError
+        errors.append(BaseError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+def compile_c_predictor(c_src):
+    from cffi import FFI
+
+    # Name the module after the source so a retrained tree gets a fresh build
+    name = "_plant_tree_" + hashlib.sha1(c_src.encode()).hexdigest()[:12]
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    built = [
+        p for p in CACHE_DIR.glob(f"{name}.*")
+        if any(str(p).endswith(ext) for ext in importlib.machinery.EXTENSION_SUFFIXES)
+    ]
+    if built:
+        path = str(built[0])
+    else:
+        ffi = FFI()
+        ffi.cdef("int predict(double x0, double x1, double x2);")
+        ffi.set_source(name, c_src)
+        # Build in a scratch dir so only the extension is kept in the cache
+        with tempfile.TemporaryDirectory(dir=CACHE_DIR) as tmpdir:
+            output = ffi.compile(tmpdir=tmpdir)
+            path = str(CACHE_DIR / Path(output).name)
+            os.replace(output, path)
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.lib.predict
+
+@st.cache_resource
+def build_predictor():
+    # Specialize the trained tree into a native function once; fall back to
+    # generated Python when cffi or a C compiler is not available
+    clf = load_model()
+    try:
+        return compile_c_predictor(tree_c_source(clf))
+    except native_build_errors() as e:
+        logger.warning("Native tree predictor unavailable, using Python: %s", e)
+        ns = {}
+        exec(compile(tree_source(clf), "<tree>", "exec"), ns)
+        return ns["_predict"]
+
+# Grid spanning the slider ranges, used to draw the decision regions.
+# float32 matches what the tree compares against, so predict() skips a cast.
+GRID_HEIGHTS = np.linspace(10.0, 400.0, 79, dtype=np.float32)
+GRID_WIDTHS = np.linspace(0.2, 20.0, 80, dtype=np.float32)
+
+def predict_grid(h_vals, w_vals, stem_code):
+    # Classify the whole grid in one call instead of one call per cell
+    hh, ww = np.meshgrid(h_vals, w_vals)
+    X = np.stack([hh, ww], -1).reshape(-1, 2)
+    X = np.column_stack([X, np.full(len(X), stem_code, dtype=np.float32)])
+    clf = load_model()
+    if walk is None:
+        return clf.predict(X).reshape(hh.shape)
+    tree = clf.tree_
+    labels = walk(
+        X,
+        tree.feature.astype(np.int64),
+        tree.threshold,
+        tree.children_left.astype(np.int64),
+        tree.children_right.astype(np.int64),
+        leaf_labels(tree),
     )
-    return pred, rules
+    return labels.reshape(hh.shape)
+
+# Chart columns for the decision-region plot, built once per stem code.
+# cache_resource hands back the same arrays on every click.
+@st.cache_resource
+def region_chart_data(stem_code):
+    hh, ww = np.meshgrid(GRID_HEIGHTS, GRID_WIDTHS)
+    ids = predict_grid(GRID_HEIGHTS, GRID_WIDTHS, stem_code)
+    return {
+        "height_cm": hh.ravel(),
+        "leaf_width_cm": ww.ravel(),
+        "species": np.array(CLASS_NAMES)[ids.ravel()],
+    }
+
+# cache_resource hands back the same bytes object on every hit (cache_data
+# would unpickle a copy per rerun). A failed read raises and is not cached,
+# so an image added later is picked up without a restart.
+@st.cache_resource
+def _load_image(path):
+    # Image paths are relative to this file, not the working directory
+    return (APP_DIR / path).read_bytes()
+
+# Warm the cache so the first identification does not hit the disk
+for path in IMAGES:
+    try:
+        _load_image(path)
+    except OSError:
+        pass
+
+# Nothing touches the model until the first identification; the cached
+# getters load or fit it on demand.
+def classify_plant(height_cm, width_cm, stem_quality):
+    stem_code = STEM_OPTIONS.index(stem_quality)
+    return build_predictor()(height_cm, width_cm, stem_code), tree_rules()
+
+# Pre-formatted (title, caption) pairs for the species overview
+SPECIES_OVERVIEW = tuple(
+    (f"**{name}**", f"{family} · {group}")
+    for name, family, group in zip(NAMES, FAMILIES, GROUPS)
+)
 
 # -----------------------------
 # UI LAYOUT
@@ -216,7 +447,7 @@ with left:
     )
     stem_quality = st.selectbox(
         "Stem quality",
-        options=list(STEM_MAP.keys()),
+        options=STEM_OPTIONS,
         index=1,
     )
 
@@ -230,23 +461,32 @@ with right:
     st.subheader("✅ Identification result")
 
     if identify:
-        species_key, rules_text = classify_plant(height, width, stem_quality)
-        plant = PLANT_DB[species_key]
+        idx, rules_text = classify_plant(height, width, stem_quality)
 
-        st.success(f"Predicted species: **{plant['name']}**")
-        st.write(f"**Family:** {plant['family']} · **Group:** {plant['group']}")
+        st.success(f"Predicted species: **{NAMES[idx]}**")
+        st.write(f"**Family:** {FAMILIES[idx]} · **Group:** {GROUPS[idx]}")
 
         # Image (optional)
         try:
-            st.image(plant["image"], caption=plant["name"], use_column_width=True)
-        except Exception:
+            image = _load_image(IMAGES[idx])
+        except OSError:
             st.warning("Image not found. Put an image file in the `images/` folder.")
+        else:
+            st.image(image, caption=NAMES[idx], use_column_width=True)
 
         st.markdown("#### 🌱 Species description")
-        st.markdown(plant["description"])
+        st.markdown(DESCRIPTIONS[idx])
 
         st.markdown("#### 🌿 Other plants in this group")
-        st.write(", ".join(plant["other_plants"]))
+        st.write(", ".join(OTHERS[idx]))
+
+        st.markdown(f"#### 🗺️ Decision regions for a {stem_quality} stem")
+        st.scatter_chart(
+            region_chart_data(STEM_OPTIONS.index(stem_quality)),
+            x="height_cm",
+            y="leaf_width_cm",
+            color="species",
+        )
 
         with st.expander("📊 View decision tree rules"):
             st.text(rules_text)
@@ -255,8 +495,6 @@ with right:
 
 st.markdown("---")
 st.subheader("📚 Plant species included in this demo")
-cols = st.columns(4)
-for i, (k, plant) in enumerate(PLANT_DB.items()):
-    with cols[i % 4]:
-        st.markdown(f"**{plant['name']}**")
-        st.caption(f"{plant['family']} · {plant['group']}")
+for col, (title, caption) in zip(st.columns(4), SPECIES_OVERVIEW):
+    col.markdown(title)
+    col.caption(caption)
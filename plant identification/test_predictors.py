@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+# Every value the sliders can produce, for each stem code
+HEIGHTS = np.arange(10.0, 401.0, 1.0)
+WIDTHS = np.round(np.arange(0.2, 20.05, 0.1), 1)
+STEM_CODES = range(3)
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    # Keep the model and native builds out of the real ~/.cache/plant_id
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("HOME", str(tmp_path_factory.mktemp("home")))
+        import app
+
+        mp.setattr(app, "CACHE_DIR", tmp_path_factory.mktemp("cache"))
+        yield app
+
+
+@pytest.fixture(scope="module")
+def clf(app):
+    return app.train_model()
+
+
+def slider_grid(stem_code):
+    hh, ww = np.meshgrid(HEIGHTS, WIDTHS)
+    return np.column_stack([hh.ravel(), ww.ravel(), np.full(hh.size, stem_code)])
+
+
+@pytest.mark.parametrize("stem_code", STEM_CODES)
+def test_python_predictor_matches_sklearn(app, clf, stem_code):
+    ns = {}
+    exec(compile(app.tree_source(clf), "<tree>", "exec"), ns)
+    X = slider_grid(stem_code)
+    got = [ns["_predict"](h, w, s) for h, w, s in X.tolist()]
+    np.testing.assert_array_equal(got, clf.predict(X))
+
+
+@pytest.mark.parametrize("stem_code", STEM_CODES)
+def test_c_predictor_matches_sklearn(app, clf, stem_code):
+    pytest.importorskip("cffi")
+    try:
+        predict = app.compile_c_predictor(app.tree_c_source(clf))
+    except app.native_build_errors() as e:
+        pytest.skip(f"no native build: {e}")
+    X = slider_grid(stem_code)
+    got = [predict(h, w, s) for h, w, s in X.tolist()]
+    np.testing.assert_array_equal(got, clf.predict(X))
+
+
+@pytest.mark.parametrize("stem_code", STEM_CODES)
+def test_predict_grid_matches_sklearn(app, clf, stem_code):
+    heights = HEIGHTS.astype(np.float32)
+    widths = WIDTHS.astype(np.float32)
+    got = app.predict_grid(heights, widths, stem_code)
+    hh, ww = np.meshgrid(heights, widths)
+    X = np.column_stack([hh.ravel(), ww.ravel(), np.full(hh.size, stem_code)])
+    np.testing.assert_array_equal(got.ravel(), clf.predict(X))
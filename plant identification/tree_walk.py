@@ -0,0 +1,18 @@
+import numpy as np
+from numba import njit
+
+# Batch descent of a fitted sklearn tree, used for the decision-region grid.
+# Kept out of app.py so cache=True stores the compiled kernel under this
+# module instead of the Streamlit script.
+@njit(cache=True)
+def walk(X, feature, threshold, left, right, leaf_label):
+    out = np.empty(X.shape[0], dtype=np.int32)
+    for i in range(X.shape[0]):
+        node = 0
+        while left[node] != -1:
+            if X[i, feature[node]] <= threshold[node]:
+                node = left[node]
+            else:
+                node = right[node]
+        out[i] = leaf_label[node]
+    return out